@@ -0,0 +1,209 @@
+# api_client.py
+#
+# Shared OpenAI client layer: rate limiting, retries with backoff, request coalescing,
+# connection reuse and per-endpoint metrics for the long-context and PDF scripts.
+
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_SECOND = float(os.getenv("OPENAI_REQUESTS_PER_SECOND", 50))
+DEFAULT_BURST = int(os.getenv("OPENAI_BURST", 50))
+DEFAULT_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 8))
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    openai.error.APIError,
+)
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class EndpointMetrics:
+    """Request, retry and failure counts plus recent latencies for one endpoint."""
+
+    def __init__(self, window=10000):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.coalesced = 0
+        self.latencies = deque(maxlen=window)
+        self.first_request = None
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        elapsed = time.monotonic() - self.first_request if self.first_request else 0.0
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'coalesced': self.coalesced,
+            'p50_ms': percentile(0.50) * 1000,
+            'p99_ms': percentile(0.99) * 1000,
+            'requests_per_s': self.requests / elapsed if elapsed else 0.0,
+        }
+
+def retry_after_seconds(error):
+    """Delay the server asked for in a Retry-After (or retry-after-ms) header, if any."""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def is_retryable(error):
+    if not isinstance(error, RETRYABLE_ERRORS):
+        return False
+    status = getattr(error, 'http_status', None)
+    return status is None or status == 429 or status >= 500
+
+class APIClient:
+    """Calls OpenAI endpoints through a shared rate limiter, retry policy and connection pool.
+
+    Identical requests that are already in flight are coalesced: later callers
+    wait for the first one and share its response.
+    """
+
+    def __init__(
+        self,
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+        burst=DEFAULT_BURST,
+        max_retries=DEFAULT_MAX_RETRIES,
+        base_delay=1.0,
+        max_delay=60.0,
+        pool_size=32,
+    ):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = defaultdict(EndpointMetrics)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # openai uses this session for every request, so connections are reused across threads
+        openai.requestssession = self.session
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, request_fn, coalesce=True, **kwargs):
+        """Run `request_fn(**kwargs)` for `endpoint` with rate limiting, retries and coalescing."""
+        if not coalesce:
+            return self._call_with_retries(endpoint, request_fn, kwargs)
+
+        key = (endpoint, json.dumps(kwargs, sort_keys=True, default=str))
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.metrics[endpoint].coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._call_with_retries(endpoint, request_fn, kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _call_with_retries(self, endpoint, request_fn, kwargs):
+        metrics = self.metrics[endpoint]
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            start = time.monotonic()
+            if metrics.first_request is None:
+                metrics.first_request = start
+            metrics.requests += 1
+            try:
+                result = request_fn(**kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    metrics.failures += 1
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    # Exponential backoff with full jitter
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                metrics.retries += 1
+                logger.warning(f"{endpoint} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            metrics.latencies.append(time.monotonic() - start)
+            return result
+
+    def embed(self, texts, model="text-embedding-ada-002"):
+        """Embeddings for `texts`, in input order."""
+        response = self.call("embeddings", openai.Embedding.create, input=texts, model=model)
+        return [item['embedding'] for item in sorted(response['data'], key=lambda item: item['index'])]
+
+    def chat(self, messages, model="gpt-3.5-turbo", **kwargs):
+        """Content of the first choice of a chat completion."""
+        response = self.call("chat", openai.ChatCompletion.create, messages=messages, model=model, **kwargs)
+        return response.choices[0].message['content']
+
+    def metrics_report(self):
+        lines = []
+        for endpoint, metrics in sorted(self.metrics.items()):
+            s = metrics.summary()
+            lines.append(
+                f"{endpoint}: {s['requests']} requests ({s['requests_per_s']:.1f}/s), {s['retries']} retries, "
+                f"{s['failures']} failures, {s['coalesced']} coalesced, p50 {s['p50_ms']:.0f} ms, p99 {s['p99_ms']:.0f} ms"
+            )
+        return "\n".join(lines)
+
+@functools.lru_cache(maxsize=None)
+def default_client():
+    """The process-wide client, configured from OPENAI_REQUESTS_PER_SECOND, OPENAI_BURST and OPENAI_MAX_RETRIES."""
+    return APIClient()
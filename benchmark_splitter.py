@@ -0,0 +1,223 @@
+# benchmark_splitter.py
+#
+# Checks RecursiveTextSplitter against the implementation it replaced and times both on large texts.
+# Usage: python benchmark_splitter.py parity --cases 500
+#        python benchmark_splitter.py speed --size-mb 10 --chunk-size 1000
+#        python benchmark_splitter.py tokens --size-mb 2 --chunk-size 500
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import time
+from typing import List
+
+# The splitter lives in a script whose file name is not importable
+_spec = importlib.util.spec_from_file_location(
+    "semantic_text_splitter", os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantic text spliter.py")
+)
+splitter_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(splitter_module)
+RecursiveTextSplitter = splitter_module.RecursiveTextSplitter
+
+# Legacy implementation, kept verbatim for comparison
+class LegacyRecursiveTextSplitter(RecursiveTextSplitter):
+    def _split_text(self, text: str, separators: List[str]) -> List[str]:
+        """Split incoming text and return chunks."""
+        final_chunks = []
+        # Get appropriate separator to use
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            if _s == "":
+                separator = _s
+                break
+            if re.search(re.escape(_s), text):
+                separator = _s
+                new_separators = separators[i + 1:]
+                break
+
+        # Now split the text
+        splits = self._split_text_with_separator(text, separator)
+
+        # Now go merging things, recursively splitting longer texts.
+        _good_splits = []
+        for s in splits:
+            if self.length_function(s) < self.chunk_size:
+                _good_splits.append(s)
+            else:
+                if _good_splits:
+                    merged_text = self._merge_splits(_good_splits, separator)
+                    final_chunks.extend(merged_text)
+                    _good_splits = []
+                if not new_separators:
+                    final_chunks.append(s)
+                else:
+                    other_info = self._split_text(s, new_separators)
+                    final_chunks.extend(other_info)
+        if _good_splits:
+            merged_text = self._merge_splits(_good_splits, separator)
+            final_chunks.extend(merged_text)
+        return final_chunks
+
+    def _split_text_with_separator(self, text: str, separator: str) -> List[str]:
+        # Now that we have the separator, split the text
+        if separator:
+            splits = re.split(f"({re.escape(separator)})", text)
+            splits = [s for s in splits if s != ""]
+            return splits
+        return list(text)
+
+    def _merge_splits(self, splits: List[str], separator: str) -> List[str]:
+        # We now want to combine these smaller pieces into medium size
+        # chunks to send to the LLM.
+        separator_len = self.length_function(separator)
+
+        docs = []
+        current_doc: List[str] = []
+        total = 0
+        for d in splits:
+            _len = self.length_function(d)
+            if total + _len + (separator_len if current_doc else 0) > self.chunk_size:
+                if total > self.chunk_size:
+                    splitter_module.logger.warning(f"Created a chunk of size {total}, which is longer than the specified {self.chunk_size}")
+                if current_doc:
+                    doc = separator.join(current_doc)
+                    if doc:
+                        docs.append(doc)
+                    # Keep on popping if:
+                    # - we have a larger chunk than in the chunk overlap
+                    # - or if we still have any chunks and the length is long
+                    while total > self.chunk_overlap or (
+                        total + _len + (separator_len if current_doc else 0) > self.chunk_size and total > 0
+                    ):
+                        total -= self.length_function(current_doc[0]) + (separator_len if len(current_doc) > 1 else 0)
+                        current_doc = current_doc[1:]
+            current_doc.append(d)
+            total += _len + (separator_len if len(current_doc) > 1 else 0)
+        doc = separator.join(current_doc)
+        if doc:
+            docs.append(doc)
+        return docs
+
+# Synthetic data
+WORDS = ["engine", "torque", "manual", "the", "a", "of", "maintenance", "interval", "is", "km", "hydraulic", "x"]
+
+def random_text(rng, n_pieces):
+    """Words joined by a mix of the default separators, including runs and odd characters."""
+    glue = [" ", " ", " ", "\n", "\n\n", "  ", "\n\n\n", "", ".", "\t"]
+    pieces = []
+    for _ in range(n_pieces):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.05:
+            # Long unbroken runs force the character-level fallback
+            word = word * rng.randint(5, 60)
+        pieces.append(word)
+        pieces.append(rng.choice(glue))
+    return "".join(pieces)
+
+def synthetic_text(size_bytes, seed=0, whitespace=True):
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < size_bytes:
+        if whitespace:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))) + "."
+            sentence += "\n\n" if rng.random() < 0.1 else ("\n" if rng.random() < 0.2 else " ")
+        else:
+            sentence = "".join(rng.choice(WORDS) for _ in range(20))
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:size_bytes]
+
+def word_count(text):
+    # A non-trivial length function that, like a tokenizer, is not additive over separators
+    return len(text.split()) + text.count("\n")
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def check_parity(args):
+    rng = random.Random(args.seed)
+    separator_sets = [None, ["\n\n", "\n", " ", ""], ["\n", " "], [" ", ""], ["."], ["\n\n", "x", ""]]
+    splitter_module.logger.disabled = True
+    for case in range(args.cases):
+        text = random_text(rng, rng.randint(0, 400))
+        chunk_size = rng.randint(1, 300)
+        kwargs = dict(
+            chunk_size=chunk_size,
+            chunk_overlap=rng.randint(0, chunk_size + 20),
+            separators=rng.choice(separator_sets),
+            length_function=rng.choice([len, word_count]),
+        )
+        expected = LegacyRecursiveTextSplitter(**kwargs).split_text(text)
+        actual = RecursiveTextSplitter(**kwargs).split_text(text)
+        assert expected == actual, f"case {case} differs: {kwargs}"
+    print(f"{args.cases} random cases: chunks match the legacy splitter")
+
+def bench_speed(args):
+    size = int(args.size_mb * 1024 * 1024)
+    splitter_module.logger.disabled = True
+    for label, whitespace in [("prose", True), ("no whitespace", False)]:
+        text = synthetic_text(size, whitespace=whitespace)
+        kwargs = dict(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        legacy, legacy_time = timed(LegacyRecursiveTextSplitter(**kwargs).split_text, text)
+        new, new_time = timed(RecursiveTextSplitter(**kwargs).split_text, text)
+        assert legacy == new, f"{label}: chunks differ from the legacy splitter"
+
+        mb = len(text) / 1024 / 1024
+        print(f"{label} ({mb:.1f} MB, {len(new)} chunks):")
+        print(f"  legacy list-slicing merge: {legacy_time:8.2f}s ({mb / legacy_time:.2f} MB/s)")
+        print(f"  deque merge:               {new_time:8.2f}s ({mb / new_time:.2f} MB/s)")
+        print(f"  speedup: {legacy_time / new_time:.1f}x (chunks match)")
+
+def bench_tokens(args):
+    size = int(args.size_mb * 1024 * 1024)
+    splitter_module.logger.disabled = True
+    encoding = splitter_module.get_encoding()
+    text = synthetic_text(size)
+
+    def naive_tokens(fragment):
+        return len(encoding.encode(fragment, disallowed_special=()))
+
+    kwargs = dict(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    naive, naive_time = timed(RecursiveTextSplitter(length_function=naive_tokens, **kwargs).split_text, text)
+    new, new_time = timed(RecursiveTextSplitter.from_tiktoken_encoder(**kwargs).split_text, text)
+    assert naive == new, "token-counter chunks differ from a plain tokenizer length function"
+
+    largest = max(map(naive_tokens, new))
+    mb = len(text) / 1024 / 1024
+    print(f"prose ({mb:.1f} MB, {len(new)} chunks, largest {largest} tokens for a {args.chunk_size}-token budget):")
+    print(f"  encode per length call: {naive_time:8.2f}s ({mb / naive_time:.2f} MB/s)")
+    print(f"  memoized TokenCounter:  {new_time:8.2f}s ({mb / new_time:.2f} MB/s)")
+    print(f"  speedup: {naive_time / new_time:.1f}x (chunks match)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark RecursiveTextSplitter.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parity_parser = subparsers.add_parser("parity", help="Compare chunks with the legacy splitter on random inputs")
+    parity_parser.add_argument("--cases", type=int, default=500)
+    parity_parser.add_argument("--seed", type=int, default=0)
+    parity_parser.set_defaults(func=check_parity)
+
+    speed_parser = subparsers.add_parser("speed", help="Time legacy vs current splitter on large synthetic texts")
+    speed_parser.add_argument("--size-mb", type=float, default=10)
+    speed_parser.add_argument("--chunk-size", type=int, default=1000)
+    speed_parser.add_argument("--chunk-overlap", type=int, default=200)
+    speed_parser.set_defaults(func=bench_speed)
+
+    tokens_parser = subparsers.add_parser("tokens", help="Time a plain tokenizer length function vs TokenCounter")
+    tokens_parser.add_argument("--size-mb", type=float, default=2)
+    tokens_parser.add_argument("--chunk-size", type=int, default=500)
+    tokens_parser.add_argument("--chunk-overlap", type=int, default=50)
+    tokens_parser.set_defaults(func=bench_tokens)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bm25_index.py
+#
+# Lexical BM25 index over the chunk documents of a Chroma collection, kept in SQLite next to
+# ./chromadb_csv so exact model codes, trims and IDs can be matched without embeddings.
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+BM25_ROOT = os.getenv("BM25_INDEX_ROOT", "./chromadb_csv_bm25")
+
+# Words, plus codes joined by '-', '.', '/' (e.g. F-150, 2.5L); compound codes are also indexed by their parts
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+_PART_PATTERN = re.compile(r"[-./]")
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if _PART_PATTERN.search(token):
+            tokens.extend(part for part in _PART_PATTERN.split(token) if part)
+    return tokens
+
+def index_path(collection_name, root=BM25_ROOT):
+    return os.path.join(root, f"{collection_name}.sqlite")
+
+class BM25Index:
+    """Inverted index of chunk documents, scored with Okapi BM25.
+
+    Documents are keyed by their Chroma id, so `upsert` and `delete` mirror
+    the collection writes. Safe to call from the ingestion writer thread.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_id ON postings (id);"
+        )
+        self._conn.commit()
+
+    def upsert(self, ids, documents):
+        with self._lock:
+            self._delete(ids)
+            self._conn.executemany(
+                "INSERT INTO docs (id, length) VALUES (?, ?)",
+                [(doc_id, len(tokenize(document))) for doc_id, document in zip(ids, documents)]
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)",
+                [
+                    (term, doc_id, tf)
+                    for doc_id, document in zip(ids, documents)
+                    for term, tf in Counter(tokenize(document)).items()
+                ]
+            )
+            self._conn.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+
+    def _delete(self, ids):
+        for i in range(0, len(ids), 500):
+            batch = list(ids[i:i + 500])
+            placeholders = ','.join('?' * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", batch)
+
+    def reset(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM postings; DELETE FROM docs;")
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query, n_results=10):
+        """Return up to `n_results` (id, score) pairs, best first."""
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            avg_length = total_length / n_docs
+            scores = Counter()
+            for term, query_tf in terms.items():
+                postings = self._conn.execute(
+                    "SELECT p.id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += query_tf * idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+def open_index(collection_name, root=BM25_ROOT):
+    return BM25Index(index_path(collection_name, root))
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked id lists into one list of (id, score), best first."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,86 @@
+# context_assembly.py
+#
+# Turns ranked retrieval results into prompt context: near-duplicate removal, token-budget
+# packing and "lost in the middle" reordering, shared by the long-context scripts.
+
+import functools
+import re
+from typing import Callable, List, Sequence
+
+import tiktoken
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name="cl100k_base"):
+    return tiktoken.get_encoding(name)
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+# Reordering strategies. Each takes documents ranked best first and returns a new list.
+
+def litm_reorder(documents: Sequence[str]) -> List[str]:
+    """Lost in the Middle reordering: the best documents go to both ends, the weakest to the middle.
+
+    Same order as the old reverse-then-insert(0) loop, in linear time and
+    without touching `documents`.
+    """
+    reversed_docs = list(documents)[::-1]
+    return reversed_docs[::2][::-1] + reversed_docs[1::2]
+
+def interleave_ends(documents: Sequence[str]) -> List[str]:
+    """Alternate between the front and the back of the ranking: first, last, second, second to last, ..."""
+    n = len(documents)
+    return [documents[i // 2] if i % 2 == 0 else documents[-(i // 2 + 1)] for i in range(n)]
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+def is_near_duplicate(shingles: frozenset, kept: List[frozenset], threshold: float) -> bool:
+    for other in kept:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+def pack_context(
+    documents: Sequence[str],
+    max_tokens: int,
+    token_counter: Callable[[str], int] = count_tokens,
+    separator: str = "\n",
+    dedupe_threshold: float = 0.9,
+) -> List[str]:
+    """Pick documents in rank order until `max_tokens` is used up.
+
+    A document whose word-trigram Jaccard similarity with one already picked
+    reaches `dedupe_threshold` is skipped, as is one that no longer fits;
+    smaller documents further down can still fill the remaining budget.
+    """
+    separator_tokens = token_counter(separator)
+    picked = []
+    kept_shingles = []
+    used = 0
+    for document in documents:
+        shingles = _shingles(document)
+        if is_near_duplicate(shingles, kept_shingles, dedupe_threshold):
+            continue
+        cost = token_counter(document) + (separator_tokens if picked else 0)
+        if used + cost > max_tokens:
+            continue
+        picked.append(document)
+        kept_shingles.append(shingles)
+        used += cost
+    return picked
+
+def assemble_context(
+    documents: Sequence[str],
+    max_tokens: int,
+    reorder: Callable[[Sequence[str]], List[str]] = litm_reorder,
+    separator: str = "\n",
+    **pack_kwargs,
+) -> str:
+    """Pack ranked `documents` into `max_tokens`, reorder what was picked and join it."""
+    picked = pack_context(documents, max_tokens, separator=separator, **pack_kwargs)
+    return separator.join(reorder(picked))
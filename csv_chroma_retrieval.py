@@ -3,13 +3,22 @@
 import chromadb
 from chromadb.config import Settings
 from chromadb_mistral_embeddings import MistralEmbeddingFunction
+from embedding_cache import CachedEmbeddingFunction, default_cache
+from bm25_index import index_path, open_index, reciprocal_rank_fusion
 from dotenv import load_dotenv
 from mistralai.client import MistralClient
 import pandas as pd
+import argparse
 import ast
+import json
 import logging
 import colorlog
+import os
 import sys
+from collections import OrderedDict
+from itertools import chain
+import numpy as np
+from tqdm.auto import tqdm
 
 # Set up logger
 def setup_logger():
@@ -43,38 +52,355 @@ def get_collection(collection_name):
     """Get or create a collection."""
     return chroma_client.get_or_create_collection(
         name=collection_name,
-        embedding_function=MistralEmbeddingFunction(api_key=client._api_key, model_name="mistral-embed")
+        embedding_function=CachedEmbeddingFunction(
+            MistralEmbeddingFunction(api_key=client._api_key, model_name="mistral-embed"),
+            "mistral-embed",
+            default_cache()
+        )
     )
 
-def query_collection(collection, query_text, n_results=5):
+class QueryResultCache:
+    """In-process LRU cache of single-query Chroma results.
+
+    Entries are keyed by (collection, normalized query, filters) and keep the
+    largest `n_results` fetched so far, so a smaller request is served by
+    slicing. An entry is ignored once the collection version it was stored
+    under (item count plus ingestion stamp) changes. Query embeddings are
+    cached on disk separately by the embedding cache.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, n_results, version):
+        entry = self._entries.get(key)
+        if entry is not None and entry['version'] == version:
+            hits = len(entry['result']['ids'])
+            # A short result means the collection had no more matches to give
+            if entry['n_results'] >= n_results or hits < entry['n_results']:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return {field: [values[:n_results]] for field, values in entry['result'].items()}
+        self.misses += 1
+        return None
+
+    def put(self, key, n_results, version, result):
+        if self.max_entries <= 0:
+            return
+        entry = self._entries.get(key)
+        if entry is not None and entry['version'] == version and entry['n_results'] > n_results:
+            return
+        self._entries[key] = {'n_results': n_results, 'version': version, 'result': result}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+        }
+
+query_cache = QueryResultCache()
+
+def normalize_query(query_text):
+    return ' '.join(query_text.split()).casefold()
+
+def collection_version(collection):
+    """Item count plus the stamp the ingestion script records after every run."""
+    metadata = chroma_client.get_collection(name=collection.name, embedding_function=None).metadata or {}
+    return collection.count(), metadata.get('ingestion_version')
+
+def _query_key(collection, query_text, where, mode='vector'):
+    return collection.name, normalize_query(query_text), json.dumps(where, sort_keys=True), mode
+
+def _single_result(results, query_index):
+    return {field: results[field][query_index] for field in ('ids', 'metadatas', 'distances')}
+
+SEARCH_MODES = ('vector', 'lexical', 'hybrid')
+_lexical_indexes = {}
+
+def get_lexical_index(collection):
+    """The BM25 index the ingestion script built for `collection`, or None if there is none."""
+    if collection.name not in _lexical_indexes:
+        if not os.path.exists(index_path(collection.name)):
+            return None
+        _lexical_indexes[collection.name] = open_index(collection.name)
+    return _lexical_indexes[collection.name]
+
+def search(collection, query_texts, n_results=5, where=None, mode='vector'):
+    """Run `query_texts` against `collection` and return Chroma-style results.
+
+    'vector' is dense search alone, 'lexical' ranks chunks by BM25 over their
+    documents and 'hybrid' fuses the dense and BM25 rankings with reciprocal
+    rank fusion. For lexical and hybrid hits, `distances` holds
+    1 / (1 + score), so lower is still better.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if mode == 'vector':
+        return collection.query(
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            include=["metadatas", "distances"]
+        )
+
+    lexical_index = get_lexical_index(collection)
+    if lexical_index is None:
+        raise ValueError(f"No lexical index for {collection.name}; re-run the ingestion script to build it")
+    # Fetch deeper candidate lists so fusion and filters still leave n_results hits
+    depth = max(n_results * 4, 20)
+    dense = None
+    if mode == 'hybrid':
+        dense = collection.query(query_texts=query_texts, n_results=depth, where=where, include=["metadatas"])
+
+    results = {'ids': [], 'metadatas': [], 'distances': []}
+    for i, query_text in enumerate(query_texts):
+        lexical = lexical_index.search(query_text, depth if (dense or where) else n_results)
+        if dense is None:
+            ranked = lexical
+            metadatas = {}
+        else:
+            ranked = reciprocal_rank_fusion([[doc_id for doc_id, _ in lexical], dense['ids'][i]])
+            metadatas = dict(zip(dense['ids'][i], dense['metadatas'][i]))
+
+        # Lexical-only hits still need their metadata, and have to pass the where filter
+        missing = [doc_id for doc_id, _ in ranked[:depth] if doc_id not in metadatas]
+        if missing:
+            found = collection.get(ids=missing, where=where, include=["metadatas"])
+            metadatas.update(zip(found['ids'], found['metadatas']))
+
+        hits = [(doc_id, score) for doc_id, score in ranked if doc_id in metadatas][:n_results]
+        results['ids'].append([doc_id for doc_id, _ in hits])
+        results['metadatas'].append([metadatas[doc_id] for doc_id, _ in hits])
+        results['distances'].append([1 / (1 + score) for _, score in hits])
+    return results
+
+def query_collection(collection, query_text, n_results=5, where=None, cache=query_cache, mode='vector'):
     """Query the collection and return results."""
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results,
-        include=["metadatas", "distances"]
-    )
+    key = _query_key(collection, query_text, where, mode)
+    version = collection_version(collection) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(key, n_results, version)
+        if cached is not None:
+            return cached
+
+    results = search(collection, [query_text], n_results, where, mode)
+    if cache is not None:
+        cache.put(key, n_results, version, _single_result(results, 0))
     return results
 
-def process_query_results(results):
+def query_many(collection, query_texts, n_results=5, batch_size=32, decode_lists=False, where=None, cache=query_cache, mode='vector'):
+    """Query the collection for many texts and return one DataFrame per query.
+
+    Queries not found in `cache` are embedded and searched `batch_size` at a
+    time with multi-query `collection.query` calls.
+    """
+    keys = [_query_key(collection, text, where, mode) for text in query_texts]
+    version = collection_version(collection) if cache is not None else None
+    singles = [None] * len(query_texts)
+    if cache is not None:
+        for i, key in enumerate(keys):
+            cached = cache.get(key, n_results, version)
+            if cached is not None:
+                singles[i] = _single_result(cached, 0)
+
+    missing = [i for i, result in enumerate(singles) if result is None]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start+batch_size]
+        results = search(collection, [query_texts[i] for i in batch], n_results, where, mode)
+        for offset, i in enumerate(batch):
+            singles[i] = _single_result(results, offset)
+            if cache is not None:
+                cache.put(keys[i], n_results, version, singles[i])
+
+    combined = {field: [result[field] for result in singles] for field in ('ids', 'metadatas', 'distances')}
+    frames = split_by_query(process_multi_query_results(combined), len(query_texts))
+    if decode_lists:
+        frames = [decode_list_columns(df) for df in frames]
+    return frames
+
+# Metadata written by the ingestion script rather than taken from the source columns
+RESERVED_METADATA = ['filename', 'row_number', 'chunk_number', 'content_hash']
+
+def process_multi_query_results(results):
+    """Build one DataFrame for every query in `results`, column by column.
+
+    Rows carry a `query_index` column and are indexed by their rank within the
+    query. Each query keeps its best hit per source row, ordered by row
+    number. List-like metadata stays as strings; see `decode_list_columns`.
+    """
+    counts = [len(metadatas) for metadatas in results['metadatas']]
+    df = pd.DataFrame.from_records(list(chain.from_iterable(results['metadatas'])))
+    columns = [col for col in df.columns if col not in RESERVED_METADATA and col != 'distance']
+    df = df.reindex(columns=columns + ['filename', 'row_number'])
+    df.insert(len(columns), 'distance', list(chain.from_iterable(results['distances'])))
+    df.insert(0, 'query_index', np.repeat(np.arange(len(counts)), counts))
+    df.index = np.concatenate([np.arange(count) for count in counts]) if counts else []
+
+    df = df.sort_values(['query_index', 'row_number'], kind='stable')
+    return df.drop_duplicates(subset=['query_index', 'row_number'], keep='first')
+
+def split_by_query(df, n_queries):
+    """Split a `process_multi_query_results` frame into one frame per query."""
+    groups = dict(tuple(df.groupby('query_index', sort=False)))
+    empty = df.iloc[0:0]
+    return [groups.get(i, empty).drop(columns='query_index') for i in range(n_queries)]
+
+def process_query_results(results, query_index=0):
     """Process query results and return as a DataFrame."""
-    rows = []
-    for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-        row = {k: ast.literal_eval(v) if isinstance(v, str) and v.startswith('[') and v.endswith(']') else v 
-               for k, v in metadata.items() if k not in ['filename', 'row_number', 'chunk_number']}
-        row['distance'] = distance
-        row['filename'] = metadata['filename']
-        row['row_number'] = metadata['row_number']
-        rows.append(row)
-    
-    df = pd.DataFrame(rows)
-    df = df.sort_values('row_number').drop_duplicates(subset='row_number', keep='first')
+    single = {
+        'metadatas': [results['metadatas'][query_index]],
+        'distances': [results['distances'][query_index]],
+    }
+    return split_by_query(process_multi_query_results(single), 1)[0]
+
+def decode_list_columns(df, columns=None):
+    """Parse `[...]` strings in `df` into lists, e.g. before analysing list-valued columns.
+
+    Only cells that look like list literals are parsed, and each distinct
+    value is parsed once.
+    """
+    df = df.copy()
+    for col in columns if columns is not None else df.columns:
+        values = df[col]
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            continue
+        is_list = values.str.startswith('[', na=False) & values.str.endswith(']', na=False)
+        if is_list.any():
+            parsed = {value: ast.literal_eval(value) for value in values[is_list].unique()}
+            df.loc[is_list, col] = values[is_list].map(parsed)
     return df
 
+def load_queries(path):
+    """Read queries from a CSV file ('query' column, else the first column) or a JSONL file."""
+    if path.endswith('.jsonl'):
+        queries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    queries.append(record['query'] if isinstance(record, dict) else str(record))
+        return queries
+    if path.endswith('.csv'):
+        df = pd.read_csv(path, dtype=str)
+        column = 'query' if 'query' in df.columns else df.columns[0]
+        return df[column].dropna().tolist()
+    raise ValueError("Unsupported query file format. Please use CSV or JSONL files.")
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return str(value)
+    return None if pd.isna(value) else str(value)
+
+class ResultWriter:
+    """Appends result frames to a CSV or Parquet file as they are produced.
+
+    The first frame fixes the output columns; later frames are aligned to
+    them, since a CSV header or Parquet schema cannot change mid-file.
+    """
+
+    def __init__(self, path):
+        if not path.endswith(('.csv', '.parquet')):
+            raise ValueError("Unsupported output format. Please use CSV or Parquet files.")
+        self.path = path
+        self.columns = None
+        self._parquet_writer = None
+
+    def write(self, df):
+        first = self.columns is None
+        if first:
+            self.columns = list(df.columns)
+        else:
+            dropped = set(df.columns) - set(self.columns)
+            if dropped:
+                logger.warning(f"Dropping columns not present in the first batch: {sorted(dropped)}")
+            df = df.reindex(columns=self.columns)
+
+        if self.path.endswith('.csv'):
+            df.to_csv(self.path, mode='w' if first else 'a', header=first, index=False)
+        else:
+            self._write_parquet(df)
+
+    def _write_parquet(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Metadata values are stored as strings in Chroma; write them back that way
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].map(_to_text)
+        if self._parquet_writer is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+            self._parquet_writer = pq.ParquetWriter(self.path, schema)
+        table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema, preserve_index=False)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+def run_batch_queries(collection, queries_path, output_path, n_results=5, batch_size=32, mode='vector'):
+    """Run every query in `queries_path` and stream the hits to `output_path`."""
+    queries = load_queries(queries_path)
+    logger.info(f"Running {len(queries)} queries from {queries_path}...")
+
+    writer = ResultWriter(output_path)
+    try:
+        for start in tqdm(range(0, len(queries), batch_size), desc="Querying", unit="batch"):
+            batch = queries[start:start+batch_size]
+            results = search(collection, batch, n_results, mode=mode)
+            df = process_multi_query_results(results)
+            df.insert(1, 'query', [batch[i] for i in df['query_index']])
+            df['query_index'] += start
+            writer.write(df)
+    finally:
+        writer.close()
+
+    logger.info(f"Results saved to {output_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query a Chroma DB collection built by csv_ingestion_chroma.py.")
+    parser.add_argument("--collection", help="collection name (prompted for if omitted)")
+    parser.add_argument("--queries", help="CSV or JSONL file of queries to run non-interactively")
+    parser.add_argument("--output", help="CSV or Parquet file for the batch results")
+    parser.add_argument("--n-results", type=int, default=5, help="results per query")
+    parser.add_argument("--batch-size", type=int, default=32, help="queries per embedding/query call")
+    parser.add_argument("--cache-size", type=int, default=1024, help="cached query results (0 disables)")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="vector",
+                        help="dense (default), BM25 or fused ranking; lexical and hybrid fall back to vector without a BM25 index")
+    args = parser.parse_args()
+    if args.queries and not args.output:
+        parser.error("--output is required with --queries")
+    return args
+
 def main():
+    args = parse_args()
+    query_cache.max_entries = args.cache_size
     logger.info("Starting retrieval process...")
     
-    collection_name = input("Enter the name of the Chroma DB collection to query: ")
+    collection_name = args.collection or input("Enter the name of the Chroma DB collection to query: ")
     collection = get_collection(collection_name)
+    mode = args.mode
+    if mode != 'vector' and get_lexical_index(collection) is None:
+        logger.warning(f"No BM25 index for {collection_name}; using vector search. Re-run ingestion to build one.")
+        mode = 'vector'
+
+    if args.queries:
+        run_batch_queries(collection, args.queries, args.output, args.n_results, args.batch_size, mode)
+        logger.info("Retrieval process completed.")
+        return
     
     while True:
         query = input("Enter your query (or 'quit' to exit): ")
@@ -83,7 +409,7 @@ def main():
         
         n_results = int(input("Enter the number of results to retrieve: "))
         
-        results = query_collection(collection, query, n_results)
+        results = query_collection(collection, query, n_results, mode=mode)
         df = process_query_results(results)
         
         print("\nQuery Results:")
@@ -95,6 +421,8 @@ def main():
             df.to_csv(filename, index=False)
             logger.info(f"Results saved to {filename}")
     
+    stats = query_cache.stats()
+    logger.info(f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
     logger.info("Retrieval process completed.")
 
 if __name__ == "__main__":
@@ -151,7 +151,6 @@
 # ingestion_script.py
 
 import pandas as pd
-import uuid
 from tqdm.auto import tqdm
 import logging
 import sys
@@ -161,8 +160,25 @@ from chromadb_mistral_embeddings import MistralEmbeddingFunction
 from dotenv import load_dotenv
 from mistralai.client import MistralClient
 from chromadb.config import Settings
+from embedding_cache import CachedEmbeddingFunction, default_cache
+from bm25_index import open_index
 import tiktoken
+import openpyxl
 import os
+import ast
+import functools
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
 # Suppress HTTP request logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -206,117 +222,586 @@ def load_data(file_path):
     else:
         raise ValueError("Unsupported file format. Please use CSV or Excel files.")
     
-    def safe_numeric(x):
-        try:
-            return pd.to_numeric(x)
-        except:
-            return x
-    
     logger.info("Processing columns...")
-    for col in tqdm(df.columns, desc="Converting to numeric"):
-        df[col] = df[col].apply(safe_numeric)
-    
-    def safe_eval(x):
-        try:
-            return eval(x)
-        except:
-            return x
-
-    for col in tqdm(df.columns, desc="Processing list-like strings"):
-        if df[col].dtype == 'object':
-            sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else ''
-            if sample.startswith('[') and sample.endswith(']'):
-                df[col] = df[col].apply(safe_eval)
+    df = convert_columns(df)
 
     logger.info("Data loaded and processed successfully.")
     return df, os.path.basename(file_path)
 
-def chunk_text(text, max_tokens=500):
-    enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
-    chunks = []
-    current_chunk = []
-    current_count = 0
-    for token in tokens:
-        current_chunk.append(token)
-        current_count += 1
-        if current_count >= max_tokens:
-            chunks.append(enc.decode(current_chunk))
-            current_chunk = []
-            current_count = 0
-    if current_chunk:
-        chunks.append(enc.decode(current_chunk))
-    return chunks
+def convert_columns(df, progress=True, sample_size=1000):
+    """Type every column of a raw string frame as int, float, list or string."""
+    for col in tqdm(df.columns, desc="Inferring column types", disable=not progress):
+        _, df[col] = convert_column(df[col], sample_size)
+    return df
+
+def convert_column(series, sample_size=1000):
+    """Return (kind, converted series) for one raw string column.
+
+    A column is numeric only if every non-null value parses; the first
+    `sample_size` values are checked first so text columns are rejected
+    without parsing the whole column. A column whose first value looks like
+    `[...]` is parsed as list literals; anything else is left as strings.
+    """
+    values = series.dropna()
+    if values.empty:
+        return 'string', series
+
+    sample = values.iloc[:sample_size]
+    if pd.to_numeric(sample, errors='coerce').notna().all():
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.notna().sum() == len(values):
+            kind = 'int' if pd.api.types.is_integer_dtype(numeric) else 'float'
+            return kind, numeric
+
+    first = values.iloc[0]
+    if isinstance(first, str) and first.startswith('[') and first.endswith(']'):
+        # Parse each distinct value once; repeated list values are common in exports
+        parsed = {value: parse_list_literal(value) for value in values.unique()}
+        return 'list', series.map(parsed)
+
+    return 'string', series
+
+def parse_list_literal(value):
+    """Safely parse a `[...]` string, trying the fast JSON parser before ast.literal_eval."""
+    if not (isinstance(value, str) and value.startswith('[') and value.endswith(']')):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return value
+
+def iter_data_blocks(file_path, block_size=10000):
+    """Yield the source file as typed DataFrames of at most `block_size` rows.
+
+    Column types are decided once for the whole file in a first pass, so
+    every block is typed the way `load_data` types the full frame. Row labels
+    keep counting across blocks, so `row_number` metadata matches too.
+    """
+    logger.info(f"Streaming data from {file_path} in blocks of {block_size} rows...")
+    kinds = infer_column_kinds(_iter_raw_blocks(file_path, block_size))
+    for df in _iter_raw_blocks(file_path, block_size):
+        yield apply_column_kinds(df, kinds)
+
+def _iter_raw_blocks(file_path, block_size):
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path, dtype=str, chunksize=block_size)
+    if file_path.endswith(('.xlsx', '.xls')):
+        return _iter_excel_blocks(file_path, block_size)
+    raise ValueError("Unsupported file format. Please use CSV or Excel files.")
+
+def infer_column_kinds(blocks):
+    """Map column -> kind for raw string blocks, as convert_column would decide on the concatenated frame."""
+    state = {}
+    for df in blocks:
+        for col in df.columns:
+            numeric_ok, all_int, first = state.get(col, (True, True, None))
+            values = df[col].dropna()
+            if first is None and not values.empty:
+                first = values.iloc[0]
+            if numeric_ok:
+                numeric = pd.to_numeric(df[col], errors='coerce')
+                numeric_ok = numeric.notna().sum() == len(values)
+                all_int = all_int and pd.api.types.is_integer_dtype(numeric)
+            state[col] = (numeric_ok, all_int, first)
+
+    kinds = {}
+    for col, (numeric_ok, all_int, first) in state.items():
+        if first is None:
+            kinds[col] = 'string'
+        elif numeric_ok:
+            kinds[col] = 'int' if all_int else 'float'
+        elif isinstance(first, str) and first.startswith('[') and first.endswith(']'):
+            kinds[col] = 'list'
+        else:
+            kinds[col] = 'string'
+    return kinds
+
+def apply_column_kinds(df, kinds):
+    for col in df.columns:
+        kind = kinds.get(col, 'string')
+        if kind == 'int':
+            df[col] = pd.to_numeric(df[col])
+        elif kind == 'float':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+        elif kind == 'list':
+            df[col] = df[col].map(parse_list_literal)
+    return df
+
+def _iter_excel_blocks(file_path, block_size):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+
+        block = []
+        start = 0
+        for row in rows:
+            block.append([_excel_cell_to_str(v) for v in row[:len(columns)]])
+            if len(block) == block_size:
+                yield pd.DataFrame(block, columns=columns, index=range(start, start + len(block)))
+                start += len(block)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=columns, index=range(start, start + len(block)))
+    finally:
+        workbook.close()
+
+def _excel_cell_to_str(value):
+    # Mirror pd.read_excel(dtype=str): blanks are NaN and whole floats lose their ".0"
+    if value is None:
+        return float('nan')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name="cl100k_base"):
+    return tiktoken.get_encoding(name)
+
+def chunk_text(text, max_tokens=500, overlap=0):
+    return chunk_texts([text], max_tokens, overlap)[0]
+
+def chunk_texts(texts, max_tokens=500, overlap=0, num_threads=None):
+    """Split each text into windows of at most `max_tokens` tokens.
+
+    Consecutive windows share `overlap` tokens. Every token covers at least one
+    byte, so texts whose UTF-8 length is within `max_tokens` are returned as a
+    single chunk without being tokenized; the rest are encoded together with
+    `encode_batch` across `num_threads` threads (default: one per CPU) and
+    sliced into windows.
+    """
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap must be non-negative and smaller than max_tokens")
+
+    results = [None] * len(texts)
+    long_indices = []
+    for i, text in enumerate(texts):
+        if not text:
+            results[i] = []
+        elif len(text.encode('utf-8')) <= max_tokens:
+            results[i] = [text]
+        else:
+            long_indices.append(i)
+
+    if long_indices:
+        enc = get_encoding()
+        step = max_tokens - overlap
+        long_texts = [texts[i] for i in long_indices]
+        num_threads = num_threads or os.cpu_count() or 1
+        if num_threads > 1:
+            token_lists = enc.encode_batch(long_texts, num_threads=num_threads)
+        else:
+            token_lists = [enc.encode(text) for text in long_texts]
+        for i, tokens in zip(long_indices, token_lists):
+            results[i] = [enc.decode(tokens[start:start + max_tokens])
+                          for start in range(0, max(len(tokens) - overlap, 1), step)]
+    return results
+
+# Concurrent embedding pipeline
+class AdaptiveConcurrencyLimiter:
+    """Bounds the number of embedding requests in flight.
+
+    The limit grows by one after `increase_every` fast successful calls and is
+    halved whenever a call is rate limited or slower than `target_latency`.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, target_latency=10.0, increase_every=4):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.increase_every = increase_every
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency=None, rate_limited=False):
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited or (latency is not None and latency > self.target_latency):
+                self.limit = max(self.minimum, self.limit // 2)
+                self._successes = 0
+            elif latency is not None:
+                self._successes += 1
+                if self._successes >= self.increase_every and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+def is_rate_limit_error(error):
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message
+
+def embed_with_retry(embedding_function, documents, limiter, max_retries=6):
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            embeddings = embedding_function(documents)
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            limiter.release(rate_limited=rate_limited)
+            if not rate_limited or attempt == max_retries:
+                raise
+            delay = min(60, 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Embedding request rate limited, retrying in {delay:.1f}s (concurrency now {limiter.limit})")
+            time.sleep(delay)
+        else:
+            limiter.release(latency=time.monotonic() - start)
+            return embeddings
+
+def iter_batches(ids, documents, metadatas, batch_size=100):
+    for i in range(0, len(ids), batch_size):
+        yield ids[i:i+batch_size], documents[i:i+batch_size], metadatas[i:i+batch_size]
+
+def embed_and_write(collection, embedding_function, batches, total=None, max_concurrency=8, max_retries=6, write_method='add', on_write=None):
+    """Embed batches concurrently and write them to Chroma from a single writer thread.
+
+    `batches` yields (ids, documents, metadatas) tuples and is consumed lazily:
+    at most two batches per allowed request are held in memory at any time, so
+    a slow writer or a rate-limited API applies backpressure to the producer.
+    `write_method` names the collection method used for writes ('add' or
+    'upsert'), and `on_write(ids, documents)` is called from the writer thread
+    after each successful write. Returns the number of items written.
+    """
+    write = getattr(collection, write_method)
+    limiter = AdaptiveConcurrencyLimiter(maximum=max_concurrency)
+    pending = threading.Semaphore(max_concurrency * 2)
+    write_queue = queue.Queue()
+    errors = []
+    written = 0
+
+    def embed_batch(batch):
+        batch_ids, batch_documents, batch_metadatas = batch
+        embeddings = embed_with_retry(embedding_function, batch_documents, limiter, max_retries)
+        write_queue.put((batch_ids, batch_documents, batch_metadatas, embeddings))
+
+    def on_embedded(future):
+        if future.exception() is not None:
+            errors.append(future.exception())
+            pending.release()
+
+    def writer():
+        nonlocal written
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            batch_ids, batch_documents, batch_metadatas, embeddings = item
+            try:
+                if not errors:
+                    write(
+                        ids=batch_ids,
+                        documents=batch_documents,
+                        metadatas=batch_metadatas,
+                        embeddings=embeddings
+                    )
+                    if on_write is not None:
+                        on_write(batch_ids, batch_documents)
+                    written += len(batch_ids)
+                    pbar.update(len(batch_ids))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                pending.release()
+
+    with tqdm(total=total, desc="Adding to Chroma DB", unit="chunk", leave=False) as pbar:
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for batch in batches:
+                pending.acquire()
+                if errors:
+                    break
+                executor.submit(embed_batch, batch).add_done_callback(on_embedded)
+        write_queue.put(None)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+    return written
 
 # 2. Indexing with Chroma DB
-def create_chroma_index(df, collection_name, filename):
-    logger.info(f"Creating Chroma DB index with collection name: {collection_name}...")
-    
-    # Create or get a collection
-    collection = chroma_client.create_collection(name=collection_name)
-    
-    # Create Mistral embedding function
-    mistral_ef = MistralEmbeddingFunction(api_key=client._api_key, model_name="mistral-embed")
+def get_embedding_function():
+    """Mistral embedding function that serves unchanged texts from the shared embedding cache."""
+    return CachedEmbeddingFunction(
+        MistralEmbeddingFunction(api_key=client._api_key, model_name="mistral-embed"),
+        "mistral-embed",
+        default_cache()
+    )
+
+def chunk_id(filename, original_id, occurrence, chunk_number):
+    """Deterministic chunk ID; `occurrence` tells apart rows that share an original_id."""
+    key = f"{filename}\x1f{original_id}\x1f{occurrence}\x1f{chunk_number}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+def content_hash(document, row_values):
+    """Hash of a chunk and its row's column values; positional fields such as row_number stay out."""
+    payload = json.dumps([document, row_values], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def build_chunks(df, filename, progress=True, id_counts=None):
+    """Chunk every row of `df` and return parallel lists of ids, documents and metadatas.
+
+    Each column is stringified once as a whole; row documents and metadata
+    records are then assembled from those column arrays. Pass the same
+    `id_counts` dict for every block of a file so repeated original IDs get
+    the same chunk IDs as in a single pass.
+    """
+    # iterrows() upcasts all-numeric frames to a common dtype (ints print as floats); keep that
+    if not (df.dtypes == object).any():
+        df = pd.DataFrame(df.to_numpy(), index=df.index, columns=df.columns)
+
+    columns = list(df.columns)
+    string_columns = [df.iloc[:, i].astype(str).tolist() for i in range(len(columns))]
+    string_rows = list(zip(*string_columns))
+    row_chunks = chunk_texts([' '.join(values) for values in string_rows])
+    id_counts = {} if id_counts is None else id_counts
 
-    # Check if 'id' column exists, if not, create it from the index
-    if 'id' not in df.columns:
-        logger.info("'id' column not found. Creating 'id' column from index.")
-        df['id'] = df.index.astype(str)
-    
     all_documents = []
     all_metadatas = []
     all_ids = []
 
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Processing rows"):
-        row_text = ' '.join(row.astype(str).values)
-        chunks = chunk_text(row_text)
-        
+    rows = zip(df.index.tolist(), df['id'].tolist(), string_rows, row_chunks)
+    for idx, original_id, values, chunks in tqdm(rows, total=len(df), desc="Processing rows", disable=not progress):
+        row_metadata = dict(zip(columns, values))
+        occurrence = id_counts.get(str(original_id), 0)
+        id_counts[str(original_id)] = occurrence + 1
         for chunk_idx, chunk in enumerate(chunks):
             all_documents.append(chunk)
             metadata = {
                 'filename': filename,
                 'row_number': idx,
                 'chunk_number': chunk_idx,
-                'original_id': row['id'],
-                **{col: str(row[col]) for col in df.columns}
+                'original_id': original_id,
+                **row_metadata
             }
+            metadata['content_hash'] = content_hash(chunk, row_metadata)
             all_metadatas.append(metadata)
-            all_ids.append(str(uuid.uuid4()))
+            all_ids.append(chunk_id(filename, original_id, occurrence, chunk_idx))
+
+    return all_ids, all_documents, all_metadatas
+
+def fetch_content_hashes(collection, filename, page_size=10000):
+    """Map chunk ID -> (content_hash, row_number) for everything already stored for `filename`."""
+    existing = {}
+    offset = 0
+    while True:
+        page = collection.get(where={'filename': filename}, include=['metadatas'], limit=page_size, offset=offset)
+        for chunk_id_, metadata in zip(page['ids'], page['metadatas']):
+            existing[chunk_id_] = (metadata.get('content_hash'), metadata.get('row_number'))
+        if len(page['ids']) < page_size:
+            return existing
+        offset += page_size
+
+def rebatch(items, batch_size=100):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield tuple(map(list, zip(*batch)))
+            batch = []
+    if batch:
+        yield tuple(map(list, zip(*batch)))
+
+def stamp_ingestion_version(collection):
+    """Record a new ingestion version so retrieval caches drop results from before this write."""
+    metadata = dict(collection.metadata or {})
+    if any(key.startswith('hnsw:') for key in metadata):
+        # Chroma rejects modify() calls that repeat the index settings
+        logger.warning(f"Not stamping ingestion version on {collection.name}: it has custom index settings")
+        return
+    metadata['ingestion_version'] = time.time_ns()
+    collection.modify(metadata=metadata)
+
+def rebuild_lexical_index(collection, lexical_index, page_size=10000):
+    """Re-index every document of `collection`, e.g. one ingested before the lexical index existed."""
+    lexical_index.reset()
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(offset=offset, limit=page_size, include=["documents"])
+        lexical_index.upsert(page['ids'], page['documents'])
+
+def index_batches(collection, embedding_function, batches, filename, incremental=False, total=None, lexical_index=None):
+    """Write chunk batches to `collection` and return added/updated/deleted/skipped counts.
+
+    In incremental mode, chunks whose content hash is already stored are
+    skipped (only their row_number is refreshed if rows moved), new or
+    changed chunks are upserted, and stored chunks of
+    `filename` that no longer appear in the source are deleted. Every write
+    and delete is mirrored to `lexical_index` when one is given.
+    """
+    on_write = lexical_index.upsert if lexical_index is not None else None
+    if not incremental:
+        written = embed_and_write(collection, embedding_function, batches, total=total, on_write=on_write)
+        stamp_ingestion_version(collection)
+        return {'added': written, 'updated': 0, 'deleted': 0, 'skipped': 0}
+
+    existing = fetch_content_hashes(collection, filename)
+    logger.info(f"Found {len(existing)} existing chunks for {filename}")
+    counts = {'added': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+    seen = set()
+    moved = []
+
+    def changed_items():
+        for batch in batches:
+            for item in zip(*batch):
+                item_id, _, metadata = item
+                seen.add(item_id)
+                stored_hash, stored_row = existing.get(item_id, (None, None))
+                if stored_hash == metadata['content_hash']:
+                    counts['skipped'] += 1
+                    if stored_row != metadata['row_number']:
+                        moved.append((item_id, metadata['row_number']))
+                    continue
+                counts['updated' if item_id in existing else 'added'] += 1
+                yield item
+
+    embed_and_write(collection, embedding_function, rebatch(changed_items()), write_method='upsert', on_write=on_write)
+
+    # Rows shifted by inserts or deletes above them keep their embeddings; only row_number changes
+    for i in range(0, len(moved), 1000):
+        ids, row_numbers = zip(*moved[i:i+1000])
+        collection.update(ids=list(ids), metadatas=[{'row_number': row_number} for row_number in row_numbers])
+
+    stale_ids = [item_id for item_id in existing if item_id not in seen]
+    for i in range(0, len(stale_ids), 1000):
+        collection.delete(ids=stale_ids[i:i+1000])
+        if lexical_index is not None:
+            lexical_index.delete(stale_ids[i:i+1000])
+    counts['deleted'] = len(stale_ids)
+    stamp_ingestion_version(collection)
+    return counts
+
+def open_lexical_index(collection, incremental):
+    """The BM25 index stored next to ./chromadb_csv for `collection`, in step with its contents."""
+    lexical_index = open_index(collection.name)
+    if not incremental:
+        lexical_index.reset()
+    elif lexical_index.count() != collection.count():
+        logger.info("Lexical index is out of step with the collection. Rebuilding it...")
+        rebuild_lexical_index(collection, lexical_index)
+    return lexical_index
+
+def create_chroma_index(df, collection_name, filename, incremental=False):
+    logger.info(f"Creating Chroma DB index with collection name: {collection_name}...")
+    
+    # Create or get a collection
+    if incremental:
+        collection = chroma_client.get_or_create_collection(name=collection_name)
+    else:
+        collection = chroma_client.create_collection(name=collection_name)
+    
+    # Create Mistral embedding function
+    mistral_ef = get_embedding_function()
 
-    logger.info("Adding data to Chroma DB...")
-    with tqdm(total=len(all_ids), desc="Adding to Chroma DB", unit="batch", leave=False) as pbar:
-        for i in range(0, len(all_ids), 100):  # Process in batches of 100
-            batch_ids = all_ids[i:i+100]
-            batch_documents = all_documents[i:i+100]
-            batch_metadatas = all_metadatas[i:i+100]
-            collection.add(
-                ids=batch_ids,
-                documents=batch_documents,
-                metadatas=batch_metadatas,
-                embeddings=mistral_ef(batch_documents)
-            )
-            pbar.update(len(batch_ids))
+    # Check if 'id' column exists, if not, create it from the index
+    if 'id' not in df.columns:
+        logger.info("'id' column not found. Creating 'id' column from index.")
+        df['id'] = df.index.astype(str)
     
+    all_ids, all_documents, all_metadatas = build_chunks(df, filename)
+
+    logger.info("Adding data to Chroma DB...")
+    counts = index_batches(
+        collection,
+        mistral_ef,
+        iter_batches(all_ids, all_documents, all_metadatas),  # Process in batches of 100
+        filename,
+        incremental=incremental,
+        total=len(all_ids),
+        lexical_index=open_lexical_index(collection, incremental)
+    )
+
+    log_counts(counts)
     logger.info("Chroma DB index created successfully.")
     return collection
 
+def stream_chroma_index(file_path, collection_name, block_size=10000, incremental=False):
+    """Index a file block by block so peak memory does not grow with the input size."""
+    logger.info(f"Creating Chroma DB index with collection name: {collection_name} (streaming)...")
+
+    if incremental:
+        collection = chroma_client.get_or_create_collection(name=collection_name)
+    else:
+        collection = chroma_client.create_collection(name=collection_name)
+    mistral_ef = get_embedding_function()
+    filename = os.path.basename(file_path)
+
+    def batches():
+        rows = 0
+        id_counts = {}
+        for df in iter_data_blocks(file_path, block_size):
+            if 'id' not in df.columns:
+                if rows == 0:
+                    logger.info("'id' column not found. Creating 'id' column from index.")
+                df['id'] = df.index.astype(str)
+            yield from iter_batches(*build_chunks(df, filename, progress=False, id_counts=id_counts))
+            rows += len(df)
+            logger.info(f"Processed {rows} rows (peak RSS {peak_rss_mb():.1f} MB)")
+
+    logger.info("Adding data to Chroma DB...")
+    counts = index_batches(
+        collection, mistral_ef, batches(), filename,
+        incremental=incremental, lexical_index=open_lexical_index(collection, incremental)
+    )
+
+    log_counts(counts)
+    logger.info("Chroma DB index created successfully.")
+    return collection
+
+def log_counts(counts):
+    logger.info(
+        f"Chunks: {counts['added']} added, {counts['updated']} updated, "
+        f"{counts['deleted']} deleted, {counts['skipped']} skipped"
+    )
+
 # Main Ingestion Function
-def ingest_data(csv_file):
+def ingest_data(csv_file, streaming=False, block_size=10000, incremental=False):
     logger.info("Starting data ingestion process...")
     
     # Ask user for collection name
     collection_name = input("Please enter a name for the Chroma DB collection: ")
     
-    # Load and index data
-    df, filename = load_data(csv_file)
-    
-    # Modify create_chroma_index function call to include filename
-    collection = create_chroma_index(df, collection_name, filename)
+    if streaming:
+        collection = stream_chroma_index(csv_file, collection_name, block_size, incremental=incremental)
+    else:
+        # Load and index data
+        df, filename = load_data(csv_file)
+        
+        # Modify create_chroma_index function call to include filename
+        collection = create_chroma_index(df, collection_name, filename, incremental=incremental)
     
-    logger.info("Data ingestion completed successfully.")
+    stats = default_cache().stats()
+    logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+    logger.info(f"Data ingestion completed successfully. Peak RSS: {peak_rss_mb():.1f} MB")
     return collection
 
 # Usage example
 if __name__ == "__main__":
     csv_file = input("Please enter the path to your CSV or Excel file: ")
-    ingest_data(csv_file)
+    streaming = input("Stream the file in blocks to bound memory? (yes/no): ").lower() == 'yes'
+    incremental = input("Update an existing collection incrementally? (yes/no): ").lower() == 'yes'
+    ingest_data(csv_file, streaming=streaming, incremental=incremental)
@@ -0,0 +1,155 @@
+# embedding_cache.py
+#
+# Persistent, content-addressed embedding cache shared by the ingestion and retrieval scripts.
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+def text_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _encode(embedding):
+    return array('d', embedding).tobytes()
+
+def _decode(blob):
+    values = array('d')
+    values.frombytes(blob)
+    return values.tolist()
+
+class EmbeddingCache:
+    """Embeddings keyed by (model name, SHA-256 of the text), stored in SQLite.
+
+    When the stored vectors exceed `max_bytes`, the least recently used
+    entries are evicted. `hits`, `misses` and `evictions` count lookups since
+    the cache was opened.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, embedding BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, texts):
+        """Return cached embeddings for `texts`, with None for every miss."""
+        keys = [text_key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found]
+                )
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [_decode(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, texts, embeddings):
+        now = time.time()
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                blob = _encode(embedding)
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, key, embedding, last_used) VALUES (?, ?, ?, ?)",
+                    (model, text_key(text), blob, now)
+                )
+                if cursor.rowcount:
+                    self._size += len(blob)
+            if self._size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    def _evict(self, target_bytes):
+        victims = []
+        freed = 0
+        rows = self._conn.execute("SELECT model, key, LENGTH(embedding) FROM embeddings ORDER BY last_used")
+        for model, key, size in rows:
+            if self._size - freed <= target_bytes:
+                break
+            victims.append((model, key))
+            freed += size
+        rows.close()
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND key = ?", victims)
+        self._size -= freed
+        self.evictions += len(victims)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': self._size,
+            }
+
+    def cached(self, model_name):
+        """Decorate a single-text `get_embedding(text)` function with this cache."""
+        def decorator(get_embedding):
+            @functools.wraps(get_embedding)
+            def wrapper(text):
+                [embedding] = self.get_many(model_name, [text])
+                if embedding is None:
+                    embedding = get_embedding(text)
+                    self.put_many(model_name, [text], [embedding])
+                return embedding
+            return wrapper
+        return decorator
+
+class CachedEmbeddingFunction:
+    """Chroma embedding function that only sends cache misses to the wrapped function."""
+
+    def __init__(self, embedding_function, model_name, cache):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.cache = cache
+
+    def __call__(self, input):
+        embeddings = self.cache.get_many(self.model_name, input)
+        missing = list(dict.fromkeys(text for text, embedding in zip(input, embeddings) if embedding is None))
+        if missing:
+            fresh = dict(zip(missing, (list(map(float, e)) for e in self.embedding_function(missing))))
+            self.cache.put_many(self.model_name, missing, [fresh[text] for text in missing])
+            embeddings = [fresh[text] if embedding is None else embedding for text, embedding in zip(input, embeddings)]
+        return embeddings
+
+@functools.lru_cache(maxsize=None)
+def default_cache():
+    """The process-wide cache at DEFAULT_CACHE_PATH, opened on first use."""
+    return EmbeddingCache()
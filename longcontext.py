@@ -1,50 +1,33 @@
 import chromadb
 import openai
-import time
+from api_client import default_client
+from context_assembly import assemble_context, interleave_ends, litm_reorder
+from embedding_cache import default_cache
 import numpy as np
 
 # Set your OpenAI API key
 openai.api_key = "your-api-key-here"
 
-# 1. Get embeddings using OpenAI API
+# Prompt tokens available for retrieved context (gpt-3.5-turbo has a 4k window)
+CONTEXT_TOKENS = 3000
+
+# 1. Get embeddings using OpenAI API (repeated texts are served from the embedding cache;
+#    rate limits and retries are handled by the shared API client)
+@default_cache().cached("text-embedding-ada-002")
 def get_embedding(text):
-    while True:
-        try:
-            response = openai.Embedding.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response['data'][0]['embedding']
-        except openai.error.RateLimitError:
-            print("Rate limit exceeded. Waiting for 20 seconds.")
-            time.sleep(20)
+    return default_client().embed([text], model="text-embedding-ada-002")[0]
 
-# 2. Reorder documents
-def reorder_documents(docs):
-    n = len(docs)
-    reordered = []
-    for i in range(n):
-        if i % 2 == 0:
-            reordered.append(docs[i // 2])
-        else:
-            reordered.append(docs[-(i // 2 + 1)])
-    return reordered
+# 2. Reordering and context packing come from context_assembly (interleave_ends here)
 
 # 3. Query OpenAI
 def query_openai(prompt):
-    while True:
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError:
-            print("Rate limit exceeded. Waiting for 20 seconds.")
-            time.sleep(20)
+    return default_client().chat(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+    )
 
 # Main process
 def main():
@@ -84,11 +67,8 @@ def main():
         n_results=10
     )
     
-    # Reorder documents
-    reordered_docs = reorder_documents(results['documents'][0])
-    
-    # Prepare context for OpenAI query
-    context = "\n".join(reordered_docs)
+    # Pack the ranked documents into the token budget, dropping near-duplicates, then reorder them
+    context = assemble_context(results['documents'][0], CONTEXT_TOKENS, reorder=interleave_ends)
     prompt = f"""Given this text extracts:
     -----
     {context}
@@ -100,57 +80,40 @@ def main():
     response = query_openai(prompt)
     
     print(response)
+    print(default_client().metrics_report())
 
 if __name__ == "__main__":
     main()
 # using Lost in the Middle (LiTM) reordering.
 import chromadb
 import openai
-import time
-from typing import List
+from api_client import default_client
+from context_assembly import assemble_context, interleave_ends, litm_reorder
+from embedding_cache import default_cache
 
 # Set your OpenAI API key
 openai.api_key = "your-api-key-here"
 
-# 1. Get embeddings using OpenAI API
+# Prompt tokens available for retrieved context (gpt-3.5-turbo has a 4k window)
+CONTEXT_TOKENS = 3000
+
+# 1. Get embeddings using OpenAI API (repeated texts are served from the embedding cache;
+#    rate limits and retries are handled by the shared API client)
+@default_cache().cached("text-embedding-ada-002")
 def get_embedding(text):
-    while True:
-        try:
-            response = openai.Embedding.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response['data'][0]['embedding']
-        except openai.error.RateLimitError:
-            print("Rate limit exceeded. Waiting for 20 seconds.")
-            time.sleep(20)
+    return default_client().embed([text], model="text-embedding-ada-002")[0]
 
-# 2. Lost in the Middle (LiTM) reordering
-def litm_reordering(documents: List[str]) -> List[str]:
-    documents.reverse()
-    reordered_result = []
-    for i, value in enumerate(documents):
-        if i % 2 == 1:
-            reordered_result.append(value)
-        else:
-            reordered_result.insert(0, value)
-    return reordered_result
+# 2. Lost in the Middle (LiTM) reordering and context packing come from context_assembly
 
 # 3. Query OpenAI
 def query_openai(prompt):
-    while True:
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError:
-            print("Rate limit exceeded. Waiting for 20 seconds.")
-            time.sleep(20)
+    return default_client().chat(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+    )
 
 # Main process
 def main():
@@ -190,11 +153,8 @@ def main():
         n_results=10
     )
     
-    # Apply LiTM reordering
-    reordered_docs = litm_reordering(results['documents'][0])
-    
-    # Prepare context for OpenAI query
-    context = "\n".join(reordered_docs)
+    # Pack the ranked documents into the token budget, dropping near-duplicates, then apply LiTM reordering
+    context = assemble_context(results['documents'][0], CONTEXT_TOKENS, reorder=litm_reorder)
     prompt = f"""Given this text extracts:
     -----
     {context}
@@ -206,6 +166,7 @@ def main():
     response = query_openai(prompt)
     
     print(response)
+    print(default_client().metrics_report())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,308 @@
+# rag_service.py
+#
+# Long-running question-answering service for the long-context pipeline: a persistent Chroma
+# collection, micro-batched query embedding, LiTM context assembly and streamed answers, with
+# p50/p99 latency per stage.
+# Usage: python rag_service.py serve --port 8765    (newline-delimited JSON over TCP)
+#        python rag_service.py demo --requests 50   (answer sample questions concurrently)
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import openai
+
+from api_client import default_client
+from context_assembly import assemble_context, litm_reorder
+from embedding_cache import CachedEmbeddingFunction, default_cache
+
+# Set your OpenAI API key
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-3.5-turbo"
+# Prompt tokens available for retrieved context (gpt-3.5-turbo has a 4k window)
+CONTEXT_TOKENS = 3000
+CHROMA_PATH = os.getenv("RAG_CHROMA_PATH", "./chromadb_longcontext")
+
+SAMPLE_TEXTS = [
+    "Basquetball is a great sport.",
+    "Fly me to the moon is one of my favourite songs.",
+    "The Celtics are my favourite team.",
+    "This is a document about the Boston Celtics",
+    "I simply love going to the movies",
+    "The Boston Celtics won the game by 20 points",
+    "This is just a random text.",
+    "Elden Ring is one of the best games in the last 15 years.",
+    "L. Kornet is one of the best Celtics players.",
+    "Larry Bird was an iconic NBA player.",
+]
+
+SAMPLE_QUERIES = [
+    "What can you tell me about the Celtics?",
+    "Who was Larry Bird?",
+    "Which games are worth playing?",
+    "What music do you like?",
+]
+
+# Blocking work (Chroma, tokenizing, OpenAI) runs here so the event loop keeps serving requests
+_threads = ThreadPoolExecutor(max_workers=64)
+
+def build_prompt(context, query):
+    return f"""Given this text extracts:
+    -----
+    {context}
+    -----
+    Please answer the following question:
+    {query}"""
+
+def openai_embed(texts):
+    return default_client().embed(texts, model=EMBEDDING_MODEL)
+
+async def openai_answer_stream(prompt):
+    """Yield the chat completion for `prompt` as it streams in."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def produce():
+        try:
+            response = default_client().call(
+                "chat",
+                openai.ChatCompletion.create,
+                coalesce=False,
+                model=CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True,
+            )
+            for chunk in response:
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = loop.run_in_executor(_threads, produce)
+    while (item := await queue.get()) is not None:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+    await producer
+
+class StageMetrics:
+    """Recent latencies per stage, reported as p50/p99."""
+
+    def __init__(self, window=10000):
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, stage, seconds):
+        self.latencies[stage].append(seconds)
+
+    def report(self):
+        lines = []
+        for stage, values in self.latencies.items():
+            ordered = sorted(values)
+            p50 = ordered[int(0.50 * (len(ordered) - 1))]
+            p99 = ordered[int(0.99 * (len(ordered) - 1))]
+            lines.append(f"{stage:>12}: n={len(ordered)} p50={p50 * 1000:.1f} ms p99={p99 * 1000:.1f} ms")
+        return "\n".join(lines)
+
+class MicroBatchEmbedder:
+    """Coalesces concurrent embed() calls into batched requests.
+
+    A batch is sent when `max_batch` texts are waiting or `max_wait` seconds
+    after its first text arrived; up to `max_in_flight` batches run at once.
+    `embed_fn` is a blocking function from a list of texts to embeddings.
+    """
+
+    def __init__(self, embed_fn, max_batch=64, max_wait=0.005, max_in_flight=8):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._queue = asyncio.Queue()
+        # The event loop only keeps weak references to tasks, so in-flight batches are held here
+        self._tasks = set()
+
+    async def embed(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                _threads, self.embed_fn, [text for text, _ in batch]
+            )
+            self.batches += 1
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight.release()
+
+class RAGService:
+    """Answers questions against `collection`, streaming each answer as it is generated."""
+
+    def __init__(
+        self,
+        collection,
+        embed_fn=openai_embed,
+        llm_fn=openai_answer_stream,
+        n_results=10,
+        context_tokens=CONTEXT_TOKENS,
+        max_batch=64,
+        max_wait=0.005,
+    ):
+        self.collection = collection
+        self.llm_fn = llm_fn
+        self.n_results = n_results
+        self.context_tokens = context_tokens
+        self.embedder = MicroBatchEmbedder(embed_fn, max_batch, max_wait)
+        self.metrics = StageMetrics()
+        self._batcher = None
+
+    def start(self):
+        if self._batcher is None:
+            self._batcher = asyncio.create_task(self.embedder.run())
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+
+    async def answer(self, query):
+        """Yield the answer to `query` in pieces as the LLM streams it."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        started = stage_start = time.perf_counter()
+
+        def lap(stage):
+            nonlocal stage_start
+            now = time.perf_counter()
+            self.metrics.record(stage, now - stage_start)
+            stage_start = now
+
+        embedding = await self.embedder.embed(query)
+        lap("embed")
+        results = await loop.run_in_executor(
+            _threads,
+            functools.partial(self.collection.query, query_embeddings=[embedding], n_results=self.n_results)
+        )
+        lap("retrieve")
+        context = await loop.run_in_executor(
+            _threads,
+            functools.partial(assemble_context, results['documents'][0], self.context_tokens, reorder=litm_reorder)
+        )
+        prompt = build_prompt(context, query)
+        lap("assemble")
+
+        first = True
+        async for delta in self.llm_fn(prompt):
+            if first:
+                lap("first_token")
+                first = False
+            yield delta
+        lap("generate")
+        self.metrics.record("total", time.perf_counter() - started)
+
+def open_collection(path=CHROMA_PATH, name="my_collection", embed_fn=openai_embed):
+    """The persistent collection, seeded with the sample texts the first time."""
+    collection = chromadb.PersistentClient(path=path).get_or_create_collection(name=name)
+    if collection.count() == 0:
+        collection.add(
+            documents=SAMPLE_TEXTS,
+            ids=[f"id_{i}" for i in range(len(SAMPLE_TEXTS))],
+            embeddings=embed_fn(SAMPLE_TEXTS)
+        )
+    return collection
+
+async def handle_client(service, reader, writer):
+    """Newline-delimited JSON: each {"query": ...} line gets {"delta": ...} lines and then {"done": true}."""
+    try:
+        while line := await reader.readline():
+            try:
+                query = json.loads(line)["query"]
+                async for delta in service.answer(query):
+                    writer.write((json.dumps({"delta": delta}) + "\n").encode())
+                    await writer.drain()
+                writer.write(b'{"done": true}\n')
+            except Exception as e:
+                writer.write((json.dumps({"error": str(e)}) + "\n").encode())
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(service, host, port, report_interval=60.0):
+    server = await asyncio.start_server(functools.partial(handle_client, service), host, port)
+    print(f"Serving on {host}:{port}")
+    async with server:
+        while True:
+            await asyncio.sleep(report_interval)
+            print(service.metrics.report())
+
+async def demo(service, n_requests):
+    async def ask(query):
+        return "".join([delta async for delta in service.answer(query)])
+
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(n_requests)]
+    started = time.perf_counter()
+    answers = await asyncio.gather(*(ask(query) for query in queries))
+    elapsed = time.perf_counter() - started
+    print(answers[0])
+    print(f"{n_requests} answers in {elapsed:.2f}s, {service.embedder.batches} embedding batches")
+    print(service.metrics.report())
+    await service.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-context question-answering service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Answer questions over TCP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    demo_parser = subparsers.add_parser("demo", help="Answer sample questions concurrently and report latencies")
+    demo_parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    embed_fn = CachedEmbeddingFunction(openai_embed, EMBEDDING_MODEL, default_cache())
+    service = RAGService(open_collection(embed_fn=embed_fn), embed_fn=embed_fn)
+    if args.command == "serve":
+        asyncio.run(serve(service, args.host, args.port))
+    else:
+        asyncio.run(demo(service, args.requests))
+
+if __name__ == "__main__":
+    main()
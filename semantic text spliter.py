@@ -1,16 +1,29 @@
 import fitz  # PyMuPDF
 import openai
 import chromadb
+import asyncio
+import functools
+import hashlib
 import os
 import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Callable, Dict, Any
+import tiktoken
 from tqdm import tqdm
 import colorlog
 import logging
+from api_client import default_client
 
 # Set your OpenAI API key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Threads for blocking API calls made from the async pipeline
+_api_threads = ThreadPoolExecutor(max_workers=32)
+
 # Set up colorlog
 handler = colorlog.StreamHandler()
 handler.setFormatter(colorlog.ColoredFormatter(
@@ -28,6 +41,47 @@ logger = colorlog.getLogger()
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base"):
+    return tiktoken.get_encoding(name)
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+class TokenCounter:
+    """Memoized token-count length function for RecursiveTextSplitter.
+
+    Each distinct fragment is encoded once with the shared cached encoding,
+    and `count_batch` encodes all unseen fragments of a split in one call.
+    Chunk sizes are the sum of fragment counts, so they can differ by a few
+    tokens from encoding the joined chunk.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", max_entries: int = 1000000, num_threads: int = None):
+        self.encoding = get_encoding(encoding_name)
+        self.max_entries = max_entries
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self._lengths = {}
+
+    def __call__(self, text: str) -> int:
+        length = self._lengths.get(text)
+        if length is None:
+            length = self.count_batch([text])[0]
+        return length
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        lengths = self._lengths
+        missing = list(dict.fromkeys(text for text in texts if text not in lengths))
+        if missing:
+            if len(lengths) + len(missing) > self.max_entries:
+                lengths.clear()
+            if self.num_threads > 1 and len(missing) > 1:
+                encoded = self.encoding.encode_batch(missing, num_threads=self.num_threads, disallowed_special=())
+            else:
+                encoded = [self.encoding.encode(text, disallowed_special=()) for text in missing]
+            lengths.update(zip(missing, map(len, encoded)))
+        return [lengths[text] for text in texts]
+
 class RecursiveTextSplitter:
     def __init__(
         self,
@@ -40,10 +94,22 @@ class RecursiveTextSplitter:
         self.chunk_overlap = chunk_overlap
         self.separators = separators or ["\n\n", "\n", " ", ""]
         self.length_function = length_function
+        self._separator_patterns = {}
+
+    @classmethod
+    def from_tiktoken_encoder(cls, encoding_name: str = "cl100k_base", **kwargs) -> "RecursiveTextSplitter":
+        """Splitter whose chunk_size and chunk_overlap are measured in tokens."""
+        return cls(length_function=TokenCounter(encoding_name), **kwargs)
 
     def split_text(self, text: str) -> List[str]:
         return self._split_text(text, self.separators)
 
+    def _lengths(self, splits: List[str]) -> List[int]:
+        count_batch = getattr(self.length_function, "count_batch", None)
+        if count_batch is not None:
+            return count_batch(splits)
+        return [self.length_function(s) for s in splits]
+
     def _split_text(self, text: str, separators: List[str]) -> List[str]:
         """Split incoming text and return chunks."""
         final_chunks = []
@@ -54,7 +120,7 @@ class RecursiveTextSplitter:
             if _s == "":
                 separator = _s
                 break
-            if re.search(re.escape(_s), text):
+            if _s in text:
                 separator = _s
                 new_separators = separators[i + 1:]
                 break
@@ -63,43 +129,54 @@ class RecursiveTextSplitter:
         splits = self._split_text_with_separator(text, separator)
 
         # Now go merging things, recursively splitting longer texts.
+        # Lengths are measured once here and reused by _merge_splits.
         _good_splits = []
-        for s in splits:
-            if self.length_function(s) < self.chunk_size:
+        _good_lengths = []
+        for s, _len in zip(splits, self._lengths(splits)):
+            if _len < self.chunk_size:
                 _good_splits.append(s)
+                _good_lengths.append(_len)
             else:
                 if _good_splits:
-                    merged_text = self._merge_splits(_good_splits, separator)
+                    merged_text = self._merge_splits(_good_splits, separator, _good_lengths)
                     final_chunks.extend(merged_text)
                     _good_splits = []
+                    _good_lengths = []
                 if not new_separators:
                     final_chunks.append(s)
                 else:
                     other_info = self._split_text(s, new_separators)
                     final_chunks.extend(other_info)
         if _good_splits:
-            merged_text = self._merge_splits(_good_splits, separator)
+            merged_text = self._merge_splits(_good_splits, separator, _good_lengths)
             final_chunks.extend(merged_text)
         return final_chunks
 
     def _split_text_with_separator(self, text: str, separator: str) -> List[str]:
         # Now that we have the separator, split the text
         if separator:
-            splits = re.split(f"({re.escape(separator)})", text)
+            pattern = self._separator_patterns.get(separator)
+            if pattern is None:
+                pattern = self._separator_patterns[separator] = re.compile(f"({re.escape(separator)})")
+            splits = pattern.split(text)
             splits = [s for s in splits if s != ""]
             return splits
         return list(text)
 
-    def _merge_splits(self, splits: List[str], separator: str) -> List[str]:
+    def _merge_splits(self, splits: List[str], separator: str, lengths: List[int] = None) -> List[str]:
         # We now want to combine these smaller pieces into medium size
         # chunks to send to the LLM.
         separator_len = self.length_function(separator)
+        if lengths is None:
+            lengths = self._lengths(splits)
 
         docs = []
-        current_doc: List[str] = []
+        # The window is a deque of pieces with their lengths alongside, so
+        # dropping from the front is O(1) and never re-measures a piece.
+        current_doc = deque()
+        current_lengths = deque()
         total = 0
-        for d in splits:
-            _len = self.length_function(d)
+        for d, _len in zip(splits, lengths):
             if total + _len + (separator_len if current_doc else 0) > self.chunk_size:
                 if total > self.chunk_size:
                     logger.warning(f"Created a chunk of size {total}, which is longer than the specified {self.chunk_size}")
@@ -113,75 +190,519 @@ class RecursiveTextSplitter:
                     while total > self.chunk_overlap or (
                         total + _len + (separator_len if current_doc else 0) > self.chunk_size and total > 0
                     ):
-                        total -= self.length_function(current_doc[0]) + (separator_len if len(current_doc) > 1 else 0)
-                        current_doc = current_doc[1:]
+                        total -= current_lengths.popleft() + (separator_len if len(current_doc) > 1 else 0)
+                        current_doc.popleft()
             current_doc.append(d)
+            current_lengths.append(_len)
             total += _len + (separator_len if len(current_doc) > 1 else 0)
         doc = separator.join(current_doc)
         if doc:
             docs.append(doc)
         return docs
 
+def iter_pdf_pages(pdf_path: str, first_page: int = 0, last_page: int = None):
+    """Yield (page_number, text) one page at a time, with 1-based page numbers."""
+    with fitz.open(pdf_path) as doc:
+        for page in doc.pages(first_page, last_page):
+            yield page.number + 1, page.get_text()
+
 def extract_text_from_pdf(pdf_path: str) -> str:
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+    return "".join(text for _, text in iter_pdf_pages(pdf_path))
 
-def extract_semantic_info(chunk: str) -> str:
+def split_pages(pages, splitter: "RecursiveTextSplitter"):
+    """Split (page_number, text) pages one at a time, yielding (page_number, chunk_number, chunk)."""
+    for page_number, text in pages:
+        for chunk_number, chunk in enumerate(splitter.split_text(text)):
+            yield page_number, chunk_number, chunk
+
+# Bump when the prompt or model changes so cached semantic info is regenerated
+PROMPT_VERSION = "1"
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "./semantic_info_cache.sqlite")
+ENRICHMENT_MODES = ("off", "inline", "deferred")
+
+def semantic_info_messages(chunk: str) -> List[Dict[str, str]]:
     prompt = f"""Extract key semantic information from the following text. Include main topics, key entities, and a brief summary:
 
 {chunk}
 
 Semantic Information:"""
 
-    response = openai.ChatCompletion.create(
+    return [
+        {"role": "system", "content": "You are a helpful assistant that extracts key semantic information from text."},
+        {"role": "user", "content": prompt}
+    ]
+
+def extract_semantic_info(chunk: str) -> str:
+    semantic_info = default_client().chat(
         model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that extracts key semantic information from text."},
-            {"role": "user", "content": prompt}
-        ],
+        messages=semantic_info_messages(chunk),
         max_tokens=150,
         n=1,
         temperature=0.5,
     )
 
-    return response.choices[0].message.content.strip()
+    return semantic_info.strip()
+
+async def extract_semantic_info_async(chunk: str) -> str:
+    # The shared client blocks while it waits on rate limits and retries, so run it on a thread
+    return await asyncio.get_running_loop().run_in_executor(_api_threads, extract_semantic_info, chunk)
+
+class SemanticInfoCache:
+    """Semantic info keyed by (SHA-256 of the chunk, PROMPT_VERSION), stored in SQLite."""
+
+    def __init__(self, path: str = SEMANTIC_CACHE_PATH, prompt_version: str = PROMPT_VERSION):
+        self.prompt_version = prompt_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_info ("
+            "chunk_hash TEXT NOT NULL, prompt_version TEXT NOT NULL, semantic_info TEXT NOT NULL, "
+            "PRIMARY KEY (chunk_hash, prompt_version))"
+        )
+        self._conn.commit()
+
+    def get(self, chunk: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT semantic_info FROM semantic_info WHERE chunk_hash = ? AND prompt_version = ?",
+                (chunk_hash(chunk), self.prompt_version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, chunk: str, semantic_info: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semantic_info (chunk_hash, prompt_version, semantic_info) VALUES (?, ?, ?)",
+                (chunk_hash(chunk), self.prompt_version, semantic_info)
+            )
+            self._conn.commit()
+
+@functools.lru_cache(maxsize=None)
+def default_semantic_cache() -> SemanticInfoCache:
+    return SemanticInfoCache()
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+def get_semantic_info(chunk: str, cache: SemanticInfoCache) -> str:
+    semantic_info = cache.get(chunk)
+    if semantic_info is None:
+        semantic_info = extract_semantic_info(chunk)
+        cache.put(chunk, semantic_info)
+    return semantic_info
+
+async def get_semantic_info_async(chunk: str, cache: SemanticInfoCache) -> str:
+    semantic_info = cache.get(chunk)
+    if semantic_info is None:
+        semantic_info = await extract_semantic_info_async(chunk)
+        cache.put(chunk, semantic_info)
+    return semantic_info
+
+def enrichment_metadata(semantic_info: str, enrichment: str) -> Dict[str, str]:
+    if enrichment == "inline":
+        return {"semantic_info": semantic_info}
+    if enrichment == "deferred":
+        # Picked up later by backfill_semantic_info
+        return {"semantic_info_status": "pending"}
+    if enrichment == "off":
+        return {}
+    raise ValueError(f"Unknown enrichment mode: {enrichment}")
+
+async def backfill_semantic_info(
+    collection: Any,
+    cache: SemanticInfoCache = None,
+    max_concurrency: int = 8,
+    page_size: int = 256,
+) -> Dict[str, int]:
+    """Add semantic info to chunks stored with enrichment="deferred".
+
+    Chunks are already searchable; this fills in their `semantic_info`
+    metadata with at most `max_concurrency` requests in flight. It can run
+    after ingestion or as a background task alongside it. Chunks whose
+    request fails are marked "failed" so they are not retried forever.
+    """
+    cache = cache or default_semantic_cache()
+    limit = asyncio.Semaphore(max_concurrency)
+    counts = {"enriched": 0, "failed": 0}
+
+    async def enrich(chunk):
+        async with limit:
+            return await get_semantic_info_async(chunk, cache)
+
+    while True:
+        page = await asyncio.to_thread(
+            collection.get, where={"semantic_info_status": "pending"}, limit=page_size, include=["documents"]
+        )
+        if not page["ids"]:
+            break
+        results = await asyncio.gather(*(enrich(chunk) for chunk in page["documents"]), return_exceptions=True)
+        metadatas = []
+        for item_id, result in zip(page["ids"], results):
+            if isinstance(result, Exception):
+                logger.error(f"Error enriching chunk {item_id}: {str(result)}")
+                metadatas.append({"semantic_info_status": "failed"})
+                counts["failed"] += 1
+            else:
+                metadatas.append({"semantic_info": result, "semantic_info_status": "done"})
+                counts["enriched"] += 1
+        await asyncio.to_thread(collection.update, ids=page["ids"], metadatas=metadatas)
+
+    logger.info(f"Backfilled semantic info for {counts['enriched']} chunks ({counts['failed']} failed)")
+    return counts
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Inputs allowed in a single embeddings request
+MAX_EMBEDDING_INPUTS = 2048
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed many texts in one request, returning the embeddings in input order."""
+    return default_client().embed(texts, model=EMBEDDING_MODEL)
 
 def generate_embedding(text: str) -> List[float]:
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-ada-002"
-    )
-    return response['data'][0]['embedding']
+    return embed_texts([text])[0]
 
-def store_in_chroma(collection: Any, text: str, semantic_info: str, embedding: List[float]):
-    collection.add(
-        embeddings=[embedding],
-        documents=[text],
-        metadatas=[{"semantic_info": semantic_info}]
-    )
+def chunk_id(source: str, page_number: int, chunk_number: int) -> str:
+    """Stable id for a chunk, so re-ingesting a file overwrites its chunks instead of duplicating them."""
+    return hashlib.sha256(f"{source}:{page_number}:{chunk_number}".encode('utf-8')).hexdigest()[:32]
 
-def process_and_store_pdf(pdf_path: str, collection: Any, chunk_size: int = 1000, chunk_overlap: int = 200):
-    # Extract text from PDF
-    logger.info(f"Extracting text from {pdf_path}")
-    text = extract_text_from_pdf(pdf_path)
-    
-    # Split text into chunks
-    logger.info("Splitting text into chunks")
-    splitter = RecursiveTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = splitter.split_text(text)
+class ChromaBatchWriter:
+    """Buffers chunks, embeds them in token-budgeted requests and upserts them into Chroma in bulk.
+
+    An embedding request is sent when the buffered chunks would exceed
+    `max_batch_tokens` or `max_batch_inputs`; embedded chunks are written once
+    `write_batch_size` are ready. Call `flush()` to send whatever is left.
+    Failed requests are logged and their chunks counted in `failed`.
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        embed_fn: Callable[[List[str]], List[List[float]]] = embed_texts,
+        max_batch_tokens: int = 100000,
+        max_batch_inputs: int = MAX_EMBEDDING_INPUTS,
+        write_batch_size: int = 1000,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.write_batch_size = write_batch_size
+        self.token_counter = token_counter
+        self.embedding_requests = 0
+        self.embedding_time = 0.0
+        self.write_requests = 0
+        self.write_time = 0.0
+        self.written = 0
+        self.failed = 0
+        self._pending = []
+        self._pending_tokens = 0
+        self._ready = []
+
+    def add(self, chunk_id: str, text: str, metadata: Dict[str, Any]):
+        tokens = self.token_counter(text)
+        if self._pending and (
+            self._pending_tokens + tokens > self.max_batch_tokens or len(self._pending) >= self.max_batch_inputs
+        ):
+            self._embed_pending()
+        self._pending.append((chunk_id, text, metadata))
+        self._pending_tokens += tokens
+        if len(self._ready) >= self.write_batch_size:
+            self._write_ready()
+
+    def add_many(self, items: List[tuple]):
+        for item in items:
+            self.add(*item)
+
+    def flush(self):
+        if self._pending:
+            self._embed_pending()
+        if self._ready:
+            self._write_ready()
+
+    def _embed_pending(self):
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        start = time.perf_counter()
+        try:
+            embeddings = self.embed_fn([text for _, text, _ in batch])
+        except Exception as e:
+            logger.error(f"Error embedding {len(batch)} chunks: {str(e)}")
+            self.failed += len(batch)
+            return
+        self.embedding_requests += 1
+        self.embedding_time += time.perf_counter() - start
+        self._ready.extend((*item, embedding) for item, embedding in zip(batch, embeddings))
+
+    def _write_ready(self):
+        batch, self._ready = self._ready, []
+        ids, documents, metadatas, embeddings = map(list, zip(*batch))
+        start = time.perf_counter()
+        try:
+            self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        except Exception as e:
+            logger.error(f"Error storing {len(batch)} chunks: {str(e)}")
+            self.failed += len(batch)
+            return
+        self.write_requests += 1
+        self.write_time += time.perf_counter() - start
+        self.written += len(batch)
+
+def make_splitter(chunk_size: int, chunk_overlap: int, chunk_unit: str = "characters") -> RecursiveTextSplitter:
+    """Splitter sized in "characters" or in cl100k "tokens"."""
+    if chunk_unit == "tokens":
+        return RecursiveTextSplitter.from_tiktoken_encoder(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if chunk_unit == "characters":
+        return RecursiveTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"Unknown chunk unit: {chunk_unit}")
+
+def process_and_store_pdf(
+    pdf_path: str,
+    collection: Any,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    embed_fn: Callable[[List[str]], List[List[float]]] = embed_texts,
+    chunk_unit: str = "characters",
+    enrichment: str = "inline",
+    cache: SemanticInfoCache = None,
+):
+    cache = cache or default_semantic_cache()
+
+    # Extract and split the PDF page by page, so storing starts with the first page
+    logger.info(f"Extracting and splitting text from {pdf_path}")
+    splitter = make_splitter(chunk_size, chunk_overlap, chunk_unit)
+    chunks = split_pages(iter_pdf_pages(pdf_path), splitter)
     
-    # Process each chunk
-    for chunk in tqdm(chunks, desc=f"Processing {os.path.basename(pdf_path)}", unit="chunk"):
-        semantic_info = extract_semantic_info(chunk)
-        embedding = generate_embedding(chunk)
-        store_in_chroma(collection, chunk, semantic_info, embedding)
+    # Process each chunk; embedding and storage are batched by the writer
+    name = os.path.basename(pdf_path)
+    writer = ChromaBatchWriter(collection, embed_fn)
+    count = 0
+    for page_number, i, chunk in tqdm(chunks, desc=f"Processing {name}", unit="chunk"):
+        semantic_info = get_semantic_info(chunk, cache) if enrichment == "inline" else None
+        metadata = {**enrichment_metadata(semantic_info, enrichment), "source": name, "page_number": page_number}
+        writer.add(chunk_id(name, page_number, i), chunk, metadata)
+        count += 1
+    writer.flush()
+    if writer.failed:
+        raise RuntimeError(f"{writer.failed} of {count} chunks from {pdf_path} could not be embedded or stored")
+
+    logger.info(f"Processed and stored {writer.written} chunks from {pdf_path}")
+
+def extract_and_split(
+    pdf_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_unit: str = "characters",
+    first_page: int = 0,
+    last_page: int = None,
+):
+    """Process-pool task: extract and split a range of pages of one PDF.
+
+    Returns the document's page count, the (page_number, chunk_number, chunk)
+    items of the range, and the time spent extracting and splitting.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    splitter = make_splitter(chunk_size, chunk_overlap, chunk_unit)
+    chunks = []
+    extract_time = split_time = 0.0
+    pages = iter_pdf_pages(pdf_path, first_page, last_page)
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        extract_time += time.perf_counter() - start
+        if page is None:
+            break
+        start = time.perf_counter()
+        chunks.extend(split_pages([page], splitter))
+        split_time += time.perf_counter() - start
+    return page_count, chunks, extract_time, split_time
 
-    logger.info(f"Processed and stored {len(chunks)} chunks from {pdf_path}")
+class PipelineStats:
+    """Busy time and item counts per stage, plus peak queue depths, for one folder run."""
 
-def process_pdf_folder(folder_path: str, collection_name: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self):
+        self.stage_time = defaultdict(float)
+        self.stage_items = defaultdict(int)
+        self.peak_depth = defaultdict(int)
+        self.failed_files = 0
+        self.failed_pages = 0
+        self.failed_chunks = 0
+
+    def record(self, stage: str, elapsed: float, items: int = 1):
+        self.stage_time[stage] += elapsed
+        self.stage_items[stage] += items
+
+    def observe(self, name: str, queue: asyncio.Queue):
+        self.peak_depth[name] = max(self.peak_depth[name], queue.qsize())
+
+    def log_report(self, wall_time: float):
+        logger.info(f"Pipeline finished in {wall_time:.1f}s")
+        for stage, elapsed in self.stage_time.items():
+            items = self.stage_items[stage]
+            if items:
+                logger.info(f"  {stage}: {items} calls, {elapsed:.1f}s busy, {elapsed / items * 1000:.0f} ms/call")
+        for name, depth in self.peak_depth.items():
+            logger.info(f"  peak {name} queue depth: {depth}")
+        if self.failed_files or self.failed_pages or self.failed_chunks:
+            logger.warning(
+                f"  {self.failed_files} files, {self.failed_pages} pages and {self.failed_chunks} chunks failed"
+            )
+
+async def ingest_pdfs(
+    pdf_paths: List[str],
+    collection: Any,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    max_workers: int = None,
+    max_concurrency: int = 8,
+    write_batch_size: int = 1000,
+    report_interval: float = 30.0,
+    embed_fn: Callable[[List[str]], List[List[float]]] = embed_texts,
+    chunk_unit: str = "characters",
+    pages_per_task: int = 25,
+    enrichment: str = "inline",
+    cache: SemanticInfoCache = None,
+) -> PipelineStats:
+    """Ingest PDFs through a pipeline of bounded stages.
+
+    Extraction and splitting run in a process pool, `pages_per_task` pages at
+    a time, semantic extraction runs as `max_concurrency` async workers, and a
+    single ChromaBatchWriter embeds and upserts the results in bulk. A failing
+    or slow file only holds up its own chunks, and a long document is spread
+    over the pool instead of being read whole.
+
+    `enrichment` is "inline" (semantic info before storing, cached by chunk
+    hash and prompt version), "deferred" (store now, backfill later with
+    backfill_semantic_info) or "off".
+    """
+    enrichment_metadata(None, enrichment)  # Reject unknown modes before starting
+    cache = cache or default_semantic_cache()
+    max_workers = max_workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    stats = PipelineStats()
+    chunk_queue = asyncio.Queue(maxsize=max_concurrency * 4)
+    write_queue = asyncio.Queue(maxsize=max_concurrency * 64)
+    batch_writer = ChromaBatchWriter(collection, embed_fn, write_batch_size=write_batch_size)
+    # Keep the pool busy without loading every document at once
+    pool_slots = asyncio.Semaphore(max_workers * 2)
+    progress = tqdm(desc="Storing chunks", unit="chunk")
+
+    async def split_range(executor, pdf_path, first_page):
+        """Queue the chunks of one page range and return the document's page count, or None on error."""
+        name = os.path.basename(pdf_path)
+        last_page = first_page + pages_per_task
+        async with pool_slots:
+            try:
+                page_count, chunks, extract_time, split_time = await loop.run_in_executor(
+                    executor, extract_and_split, pdf_path, chunk_size, chunk_overlap, chunk_unit, first_page, last_page
+                )
+            except Exception as e:
+                logger.error(f"Error processing {name} pages {first_page + 1}-{last_page}: {str(e)}")
+                return None
+            stats.record('extract', extract_time)
+            stats.record('split', split_time)
+            # Hold the slot until the chunks are queued, so extraction cannot run ahead of the slower stages
+            for page_number, i, chunk in chunks:
+                await chunk_queue.put((chunk_id(name, page_number, i), name, page_number, chunk))
+                stats.observe('chunk', chunk_queue)
+        return page_count
+
+    async def split_file(executor, pdf_path):
+        # The first range also tells us how many pages are left to hand out
+        page_count = await split_range(executor, pdf_path, 0)
+        if page_count is None:
+            stats.failed_files += 1
+            return
+        page_counts = await asyncio.gather(*(
+            split_range(executor, pdf_path, first_page)
+            for first_page in range(pages_per_task, page_count, pages_per_task)
+        ))
+        for first_page, result in zip(range(pages_per_task, page_count, pages_per_task), page_counts):
+            if result is None:
+                stats.failed_pages += min(pages_per_task, page_count - first_page)
+
+    async def enrich_worker():
+        while (item := await chunk_queue.get()) is not None:
+            item_id, name, page_number, chunk = item
+            semantic_info = None
+            if enrichment == "inline":
+                try:
+                    start = time.perf_counter()
+                    semantic_info = await get_semantic_info_async(chunk, cache)
+                    stats.record('semantic', time.perf_counter() - start)
+                except Exception as e:
+                    logger.error(f"Error processing chunk {item_id}: {str(e)}")
+                    stats.failed_chunks += 1
+                    continue
+            metadata = {**enrichment_metadata(semantic_info, enrichment), "source": name, "page_number": page_number}
+            await write_queue.put((item_id, chunk, metadata))
+            stats.observe('write', write_queue)
+
+    async def writer():
+        done = False
+        while not done:
+            # Hand everything already queued to the batch writer in one thread hop
+            batch = [await write_queue.get()]
+            while not write_queue.empty() and len(batch) < 256:
+                batch.append(write_queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            await asyncio.to_thread(batch_writer.add_many, batch)
+            progress.update(batch_writer.written - progress.n)
+        await asyncio.to_thread(batch_writer.flush)
+        progress.update(batch_writer.written - progress.n)
+
+    async def monitor():
+        while True:
+            await asyncio.sleep(report_interval)
+            logger.info(f"Queue depths: chunk={chunk_queue.qsize()} write={write_queue.qsize()}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        workers = [asyncio.create_task(enrich_worker()) for _ in range(max_concurrency)]
+        writer_task = asyncio.create_task(writer())
+        monitor_task = asyncio.create_task(monitor())
+
+        await asyncio.gather(*(split_file(executor, pdf_path) for pdf_path in pdf_paths))
+        for _ in workers:
+            await chunk_queue.put(None)
+        await asyncio.gather(*workers)
+        await write_queue.put(None)
+        await writer_task
+        monitor_task.cancel()
+    progress.close()
+
+    stats.record('embed', batch_writer.embedding_time, batch_writer.embedding_requests)
+    stats.record('store', batch_writer.write_time, batch_writer.write_requests)
+    stats.failed_chunks += batch_writer.failed
+    stats.log_report(time.perf_counter() - started)
+    if enrichment == "inline":
+        logger.info(f"  semantic info cache: {cache.hits} hits, {cache.misses} misses")
+    return stats
+
+def process_pdf_folder(
+    folder_path: str,
+    collection_name: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    max_workers: int = None,
+    max_concurrency: int = 8,
+    chunk_unit: str = "characters",
+    enrichment: str = "inline",
+):
+    """Ingest every PDF in `folder_path` and return the collection.
+
+    With enrichment="deferred" the chunks are searchable as soon as this
+    returns; start backfill_semantic_info on the collection to add semantic
+    info, e.g. as a background task while serving queries.
+    """
     # Initialize Chroma client and collection
     logger.info(f"Initializing Chroma collection: {collection_name}")
     client = chromadb.Client()
@@ -192,19 +713,20 @@ def process_pdf_folder(folder_path: str, collection_name: str, chunk_size: int =
     
     if not pdf_files:
         logger.warning(f"No PDF files found in {folder_path}")
-        return
+        return collection
 
     logger.info(f"Found {len(pdf_files)} PDF files in {folder_path}")
 
-    # Process each PDF file
-    for pdf_file in tqdm(pdf_files, desc="Processing PDFs", unit="file"):
-        pdf_path = os.path.join(folder_path, pdf_file)
-        try:
-            process_and_store_pdf(pdf_path, collection, chunk_size, chunk_overlap)
-        except Exception as e:
-            logger.error(f"Error processing {pdf_file}: {str(e)}")
+    # Process the PDF files concurrently
+    pdf_paths = [os.path.join(folder_path, pdf_file) for pdf_file in pdf_files]
+    asyncio.run(ingest_pdfs(
+        pdf_paths, collection, chunk_size, chunk_overlap, max_workers, max_concurrency,
+        chunk_unit=chunk_unit, enrichment=enrichment
+    ))
 
     logger.info(f"Finished processing all PDFs in {folder_path}")
+    logger.info(f"API usage:\n{default_client().metrics_report()}")
+    return collection
 
 # Example usage
 if __name__ == "__main__":
@@ -212,5 +734,17 @@ if __name__ == "__main__":
     collection_name = "multi_pdf_semantics_collection"
     chunk_size = 1000  # Adjust as needed
     chunk_overlap = 200  # Adjust as needed
+    chunk_unit = "characters"  # or "tokens" to size chunks by the embedding model's tokenizer
+    enrichment = "inline"  # "deferred" stores chunks first and adds semantic info afterwards; "off" skips it
     
-    process_pdf_folder(pdf_folder, collection_name, chunk_size, chunk_overlap)
+    collection = process_pdf_folder(pdf_folder, collection_name, chunk_size, chunk_overlap, chunk_unit=chunk_unit, enrichment=enrichment)
+
+    if enrichment == "deferred":
+        async def query_while_backfilling():
+            # The chunks are searchable already; semantic info is filled in alongside
+            backfill = asyncio.create_task(backfill_semantic_info(collection))
+            logger.info(f"{collection.count()} chunks searchable, semantic info backfilling in the background")
+            counts = await backfill
+            logger.info(f"Backfill finished: {counts}")
+
+        asyncio.run(query_while_backfilling())